@@ -1,7 +1,7 @@
-from flask import Flask, render_template, send_file, Response, request, redirect, url_for, session
+from flask import Flask, render_template, send_file, Response, request, redirect, url_for, session, jsonify
 import requests
 import base64
-from PIL import Image, ImageDraw, ImageFont
+from PIL import Image, ImageDraw, ImageFont, ImageChops, ImageStat, ImageFilter, features
 from io import BytesIO
 import time
 from datetime import datetime, timedelta
@@ -11,8 +11,24 @@ import logging
 import shutil
 from functools import wraps
 import json
-from collections import defaultdict
+from collections import defaultdict, deque, namedtuple
 import random
+import itertools
+import argparse
+import atexit
+import signal
+import sys
+import tempfile
+import zlib
+import gzip
+import hashlib
+from jinja2 import DictLoader
+from werkzeug.security import generate_password_hash, check_password_hash
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
 
 global last_cleanup_time
 
@@ -31,9 +47,22 @@ ROBOTS = {
     "x04": "http://10.158.17.38:8000/color_image_base64"
 }
 
-# Global variable to store the latest combined image
-latest_combined_image = None
-latest_combined_image_path = None
+# Latest combined frame. Writers build a new immutable FrameSnapshot and swap
+# current_frame in one assignment; readers take current_frame once and use that
+# snapshot, so they never lock and always see matching image, metadata and counts.
+FrameSnapshot = namedtuple('FrameSnapshot', [
+    'generation',    # Increases by one per published frame
+    'image',         # Combined PIL image (do not modify)
+    'path',          # Archive path (None for seeded frames; may be deleted by retention later)
+    'published_at',
+    'metadata',      # robot_id -> frame metadata copy
+    'error_counts',  # robot_id -> 7-day error count
+    'encodings',     # profile -> encoded bytes, served without touching disk
+    'encode_lock',
+    'served',        # profile -> itertools.count of responses, folded into stats on publish
+])
+current_frame = None
+frame_publish_lock = threading.Lock()  # Serializes writers only
 last_cleanup_time = None
 
 # Error tracking
@@ -91,13 +120,273 @@ def get_error_count(robot_id):
     seven_days_ago = (datetime.now() - timedelta(days=7)).strftime("%Y-%m-%d")
     total = 0
     
-    if robot_id in error_counts:
-        for date, count in error_counts[robot_id].items():
-            if date >= seven_days_ago:
-                total += count
+    # .get() so a lookup never re-creates a robot entry cleanup just removed
+    for date, count in error_counts.get(robot_id, {}).items():
+        if date >= seven_days_ago:
+            total += count
     
     return total
 
+# Error analytics (hourly/daily rollups kept beyond the 7-day error counts)
+ERROR_ANALYTICS_FILE = "error_analytics.json"
+HOURLY_RETENTION_DAYS = 90
+DAILY_RETENTION_DAYS = 730
+error_analytics = {}
+error_analytics_lock = threading.Lock()
+error_analytics_save_disabled = False  # Set if a damaged file could not be moved aside
+
+def new_robot_analytics():
+    """Create an empty analytics record for a robot"""
+    return {
+        'hourly': {},         # "YYYY-MM-DD HH" -> failures
+        'daily': {},          # "YYYY-MM-DD" -> {"failures", "outages", "outage_seconds"}
+        'outage_start': None  # epoch seconds of the open outage, if any
+    }
+
+def load_error_analytics():
+    """Load error analytics from file, seeding daily failures from error_counts"""
+    global error_analytics, error_analytics_save_disabled
+    try:
+        if os.path.exists(ERROR_ANALYTICS_FILE):
+            with open(ERROR_ANALYTICS_FILE, 'r') as f:
+                error_analytics = json.load(f)
+            logger.info("Loaded error analytics from file")
+    except Exception as e:
+        logger.error(f"Error loading error analytics: {e}")
+        # Keep the damaged file for recovery rather than saving over its history
+        try:
+            os.replace(ERROR_ANALYTICS_FILE, ERROR_ANALYTICS_FILE + '.bad')
+            logger.error(f"Moved damaged error analytics to {ERROR_ANALYTICS_FILE}.bad")
+        except OSError as move_error:
+            error_analytics_save_disabled = True
+            logger.error(f"Could not move damaged error analytics, not saving until fixed: {move_error}")
+    
+    # error_counts also counts success->error transitions, so older days carry over
+    with error_analytics_lock:
+        for robot_id, dates in error_counts.items():
+            robot = error_analytics.setdefault(robot_id, new_robot_analytics())
+            for date, count in dates.items():
+                robot['daily'].setdefault(date, {'failures': count, 'outages': 0, 'outage_seconds': 0})
+        
+        # A robot that was down at shutdown starts in the error state, so its first
+        # successful fetch closes the open outage instead of leaving it running
+        if not hasattr(get_robot_image, "previous_states"):
+            get_robot_image.previous_states = {}
+        for robot_id, robot in error_analytics.items():
+            if robot.get('outage_start') is not None:
+                get_robot_image.previous_states[robot_id] = "error"
+
+def save_error_analytics():
+    """Save error analytics to file, dropping rollups past their retention"""
+    if error_analytics_save_disabled:
+        return
+    hourly_cutoff = (datetime.now() - timedelta(days=HOURLY_RETENTION_DAYS)).strftime("%Y-%m-%d 00")
+    daily_cutoff = (datetime.now() - timedelta(days=DAILY_RETENTION_DAYS)).strftime("%Y-%m-%d")
+    try:
+        with error_analytics_lock:
+            for robot in error_analytics.values():
+                for hour in [h for h in robot['hourly'] if h < hourly_cutoff]:
+                    del robot['hourly'][hour]
+                for date in [d for d in robot['daily'] if d < daily_cutoff]:
+                    del robot['daily'][date]
+            data = json.dumps(error_analytics)
+        # Write to a temporary file first so a crash never leaves a partial file
+        with open(ERROR_ANALYTICS_FILE + '.tmp', 'w') as f:
+            f.write(data)
+        os.replace(ERROR_ANALYTICS_FILE + '.tmp', ERROR_ANALYTICS_FILE)
+    except Exception as e:
+        logger.error(f"Error saving error analytics: {e}")
+
+def get_daily_rollup(robot, date):
+    """Get (creating if needed) the daily rollup for a robot and date"""
+    return robot['daily'].setdefault(date, {'failures': 0, 'outages': 0, 'outage_seconds': 0})
+
+def record_outage_start(robot_id):
+    """Roll up a success->error transition for a robot"""
+    now = datetime.now()
+    with error_analytics_lock:
+        robot = error_analytics.setdefault(robot_id, new_robot_analytics())
+        hour = now.strftime("%Y-%m-%d %H")
+        robot['hourly'][hour] = robot['hourly'].get(hour, 0) + 1
+        get_daily_rollup(robot, now.strftime("%Y-%m-%d"))['failures'] += 1
+        # Keep the original start if the outage was already open before a restart
+        if robot['outage_start'] is None:
+            robot['outage_start'] = now.timestamp()
+    save_error_analytics()
+
+def record_outage_end(robot_id):
+    """Roll up an error->success transition, splitting the outage across days"""
+    now = datetime.now()
+    with error_analytics_lock:
+        robot = error_analytics.get(robot_id)
+        if not robot or robot['outage_start'] is None:
+            return
+        start = datetime.fromtimestamp(robot['outage_start'])
+        robot['outage_start'] = None
+        get_daily_rollup(robot, now.strftime("%Y-%m-%d"))['outages'] += 1
+        while start < now:
+            day_end = datetime.combine(start.date() + timedelta(days=1), datetime.min.time())
+            segment_end = min(day_end, now)
+            get_daily_rollup(robot, start.strftime("%Y-%m-%d"))['outage_seconds'] += (segment_end - start).total_seconds()
+            start = segment_end
+    save_error_analytics()
+
+def get_error_analytics(robot_id, days=30, resolution='daily'):
+    """Get a failure time series and summary stats for a robot from the rollups"""
+    now = datetime.now()
+    with error_analytics_lock:
+        robot = error_analytics.get(robot_id) or new_robot_analytics()
+        
+        series = []
+        if resolution == 'hourly':
+            start = (now - timedelta(days=days)).replace(minute=0, second=0, microsecond=0)
+            for i in range(days * 24 + 1):
+                hour = (start + timedelta(hours=i)).strftime("%Y-%m-%d %H")
+                series.append({'time': hour, 'failures': robot['hourly'].get(hour, 0)})
+        
+        failures = outages = 0
+        outage_seconds = 0.0
+        for i in range(days - 1, -1, -1):
+            date = (now - timedelta(days=i)).strftime("%Y-%m-%d")
+            rollup = robot['daily'].get(date)
+            if rollup:
+                failures += rollup['failures']
+                outages += rollup['outages']
+                outage_seconds += rollup['outage_seconds']
+            if resolution == 'daily':
+                series.append({
+                    'time': date,
+                    'failures': rollup['failures'] if rollup else 0,
+                    'outage_seconds': round(rollup['outage_seconds']) if rollup else 0,
+                })
+        
+        current_outage = now.timestamp() - robot['outage_start'] if robot['outage_start'] else None
+    
+    # The open outage counts as down time too
+    down_seconds = outage_seconds + (current_outage or 0)
+    window_seconds = (now - (now - timedelta(days=days - 1)).replace(hour=0, minute=0, second=0, microsecond=0)).total_seconds()
+    
+    return {
+        'robot_id': robot_id,
+        'days': days,
+        'resolution': resolution,
+        'series': series,
+        'failures': failures,
+        'outage_seconds': round(outage_seconds),
+        'mtbf_seconds': round(max(window_seconds - down_seconds, 0) / failures) if failures else None,
+        'mean_outage_seconds': round(outage_seconds / outages) if outages else None,
+        'current_outage_seconds': round(current_outage) if current_outage is not None else None,
+    }
+
+# Frame metadata per robot (capture time, fetch time, last change)
+STALE_AFTER_SECONDS = 30
+CAPTURE_TIME_KEYS = ['capture_time', 'timestamp', 'stamp', 'time']
+CAPTURE_TIME_MAX_SKEW = timedelta(days=1)  # Values further from now are not capture times
+frame_metadata = {}
+frame_metadata_lock = threading.Lock()
+
+def parse_capture_time(data):
+    """Get the robot capture time from a response payload, if it has one"""
+    for key in CAPTURE_TIME_KEYS:
+        value = data.get(key)
+        if value is None:
+            continue
+        try:
+            if isinstance(value, (int, float)):
+                # Epoch seconds, or milliseconds if the value is too large
+                if value > 1e11:
+                    value = value / 1000.0
+                capture_time = datetime.fromtimestamp(value)
+            elif isinstance(value, str):
+                capture_time = datetime.fromisoformat(value.replace('Z', '+00:00')).astimezone().replace(tzinfo=None)
+            else:
+                continue
+        except (ValueError, OverflowError, OSError) as e:
+            logger.debug(f"Could not parse capture time {key}={value!r}: {e}")
+            continue
+        
+        # Generic keys like "time" may hold a duration; only accept plausible clock times
+        if abs(datetime.now() - capture_time) <= CAPTURE_TIME_MAX_SKEW:
+            return capture_time
+        logger.debug(f"Ignoring implausible capture time {key}={value!r}")
+    return None
+
+def update_frame_metadata(robot_id, image_bytes=None, capture_time=None, error=None):
+    """Record fetch time, capture time and change time for a robot frame"""
+    now = datetime.now()
+    with frame_metadata_lock:
+        meta = frame_metadata.setdefault(robot_id, {
+            'capture_time': None,
+            'fetched_at': None,
+            'changed_at': None,
+            'image_crc': None,
+            'error': None,
+        })
+        meta['error'] = error
+        if error is not None:
+            return
+        image_crc = zlib.crc32(image_bytes)
+        if image_crc != meta['image_crc']:
+            meta['image_crc'] = image_crc
+            meta['changed_at'] = now
+        meta['capture_time'] = capture_time
+        meta['fetched_at'] = now
+
+def copy_frame_metadata(robot_id):
+    """Copy a robot's frame metadata together with its latest analysis metrics"""
+    with frame_metadata_lock:
+        meta = dict(frame_metadata.get(robot_id, {}))
+    meta['analysis'] = analysis_state.get(robot_id, {}).get('metrics')
+    return meta
+
+def get_frame_status(robot_id, meta=None):
+    """Get frame timestamps and ages (in seconds) for a robot
+    
+    Pass meta to compute the status from a published frame snapshot
+    instead of the live metadata.
+    """
+    now = datetime.now()
+    if meta is None:
+        meta = copy_frame_metadata(robot_id)
+    
+    def age(ts):
+        return round((now - ts).total_seconds(), 1) if ts else None
+    
+    capture_time = meta.get('capture_time')
+    fetched_at = meta.get('fetched_at')
+    changed_at = meta.get('changed_at')
+    # End-to-end age is measured from capture when the robot reports it
+    frame_age = age(capture_time) if capture_time else age(fetched_at)
+    unchanged_for = age(changed_at)
+    
+    return {
+        'capture_time': capture_time.isoformat() if capture_time else None,
+        'fetched_at': fetched_at.isoformat() if fetched_at else None,
+        'changed_at': changed_at.isoformat() if changed_at else None,
+        'frame_age': frame_age,
+        'unchanged_for': unchanged_for,
+        'stale': unchanged_for is None or unchanged_for > STALE_AFTER_SECONDS,
+        'error': meta.get('error'),
+        'analysis': meta.get('analysis'),
+    }
+
+# Credential cache
+USERS_FILE = 'users.txt'
+PASSWORD_HASH_PREFIXES = ('pbkdf2:', 'scrypt:')
+DUMMY_PASSWORD_HASH = generate_password_hash('dummy-password')
+credential_cache = None
+credential_cache_mtime = None
+credential_lock = threading.Lock()
+
+# Login rate limiting (failed attempts per IP)
+LOGIN_MAX_FAILURES = 5
+LOGIN_WINDOW_SECONDS = 300
+LOGIN_SWEEP_INTERVAL = 60
+LOGIN_MAX_TRACKED_IPS = 10000
+failed_logins = {}
+last_login_sweep = 0.0
+login_attempts_lock = threading.Lock()
+
 # Login required decorator
 def login_required(f):
     @wraps(f)
@@ -111,15 +400,15 @@ def load_users():
     """Load users from the users.txt file"""
     users = {}
     try:
-        if os.path.exists('users.txt'):
-            with open('users.txt', 'r') as f:
+        if os.path.exists(USERS_FILE):
+            with open(USERS_FILE, 'r') as f:
                 for line in f:
                     if ':' in line:
                         username, password = line.strip().split(':', 1)
                         users[username] = password
         else:
             # Create a default users file if it doesn't exist
-            with open('users.txt', 'w') as f:
+            with open(USERS_FILE, 'w') as f:
                 f.write('admin:admin\n')
                 f.write('user:password\n')
             users = {'admin': 'admin', 'user': 'password'}
@@ -131,6 +420,86 @@ def load_users():
     
     return users
 
+def hash_user_passwords(users):
+    """Return a copy of users with every password stored as a salted hash"""
+    hashed = {}
+    for username, password in users.items():
+        # Entries that are already hashed in users.txt are kept as they are
+        if password.startswith(PASSWORD_HASH_PREFIXES):
+            hashed[username] = password
+        else:
+            hashed[username] = generate_password_hash(password)
+    return hashed
+
+def get_users_file_mtime():
+    """Get the modification time of the users file, or None if it is missing"""
+    try:
+        return os.stat(USERS_FILE).st_mtime
+    except OSError:
+        return None
+
+def get_credentials():
+    """Get the cached credentials, reloading them only when users.txt changes"""
+    global credential_cache, credential_cache_mtime
+    
+    mtime = get_users_file_mtime()
+    with credential_lock:
+        if credential_cache is None or mtime != credential_cache_mtime:
+            credential_cache = hash_user_passwords(load_users())
+            # Re-read the mtime in case load_users() just created the file
+            credential_cache_mtime = get_users_file_mtime()
+            logger.info(f"Loaded {len(credential_cache)} users into credential cache")
+        return credential_cache
+
+def verify_user(username, password):
+    """Check a username and password against the cached credentials"""
+    password_hash = get_credentials().get(username)
+    if password_hash is None:
+        # Hash anyway so unknown users take as long as wrong passwords
+        check_password_hash(DUMMY_PASSWORD_HASH, password)
+        return False
+    return check_password_hash(password_hash, password)
+
+def prune_login_attempts(ip, now):
+    """Drop failed login attempts for an IP that fall outside the rate limit window"""
+    attempts = failed_logins.get(ip)
+    if attempts is None:
+        return 0
+    while attempts and now - attempts[0] > LOGIN_WINDOW_SECONDS:
+        attempts.popleft()
+    if not attempts:
+        del failed_logins[ip]
+        return 0
+    return len(attempts)
+
+def sweep_login_attempts(now):
+    """Drop expired attempts for all IPs and cap how many IPs are tracked"""
+    global last_login_sweep
+    if now - last_login_sweep >= LOGIN_SWEEP_INTERVAL:
+        last_login_sweep = now
+        for ip in list(failed_logins):
+            prune_login_attempts(ip, now)
+    
+    # Forget the IPs tracked longest if a flood of addresses fills the table
+    while len(failed_logins) > LOGIN_MAX_TRACKED_IPS:
+        failed_logins.pop(next(iter(failed_logins)))
+
+def reserve_login_attempt(ip):
+    """Count a login attempt for an IP up front, or return False if the IP is rate limited"""
+    now = time.time()
+    with login_attempts_lock:
+        sweep_login_attempts(now)
+        if prune_login_attempts(ip, now) >= LOGIN_MAX_FAILURES:
+            return False
+        # Counted before the password is hashed, so a parallel burst cannot slip past the limit
+        failed_logins.setdefault(ip, deque()).append(now)
+        return True
+
+def clear_failed_logins(ip):
+    """Forget failed login attempts for an IP after a successful login"""
+    with login_attempts_lock:
+        failed_logins.pop(ip, None)
+
 def delete_old_folders():
     """Delete folders older than 7 days to save disk space"""
     global last_cleanup_time
@@ -159,6 +528,325 @@ def delete_old_folders():
     except Exception as e:
         logger.error(f"Error during folder cleanup: {e}")
 
+# Frame analysis (motion, brightness, blur) on downsampled frames
+ANALYSIS_ROBOTS = set(ROBOTS.keys())  # Robots to analyze; remove ids to skip them
+ANALYSIS_SIZE = (160, 120)
+ANALYSIS_CPU_BUDGET = 0.25  # Capture thread CPU seconds per cycle across all robots
+MOTION_THRESHOLD = 0.08     # Mean absolute pixel difference (0-1)
+DARK_THRESHOLD = 20         # Mean brightness (0-255)
+BLUR_THRESHOLD = 4.0        # Edge strength standard deviation
+EVENT_LOG_SIZE = 1000
+EVENT_LOG_FILE = "events.jsonl"  # Written inside the daily image folder
+analysis_state = {}
+analysis_cycle_cpu = 0.0
+analysis_rotation = 0
+event_log = deque(maxlen=EVENT_LOG_SIZE)
+event_log_lock = threading.Lock()
+next_event_id = 1
+
+def start_analysis_cycle():
+    """Reset the analysis CPU budget and return the robot order for this cycle"""
+    global analysis_cycle_cpu, analysis_rotation
+    analysis_cycle_cpu = 0.0
+    
+    # Start from a different robot each cycle so budget skips are spread evenly
+    robot_ids = list(ROBOTS.keys())
+    start = analysis_rotation % len(robot_ids) if robot_ids else 0
+    analysis_rotation += 1
+    return robot_ids[start:] + robot_ids[:start]
+
+def record_event(robot_id, event_type, metrics, thumbnail):
+    """Add an event to the event log and save its thumbnail"""
+    global next_event_id
+    now = datetime.now()
+    date_dir = now.strftime("%Y%m%d")
+    events_dir = f"{date_dir}/events"
+    os.makedirs(events_dir, exist_ok=True)
+    
+    with event_log_lock:
+        event_id = next_event_id
+        next_event_id += 1
+    
+    thumbnail_path = f"{events_dir}/{robot_id.upper()}_{now.strftime('%Y-%m-%d_%H-%M-%S')}_{event_type}_{event_id}.jpg"
+    event = {
+        'id': event_id,
+        'robot_id': robot_id,
+        'type': event_type,
+        'time': now.isoformat(),
+        'metrics': metrics,
+        'thumbnail': thumbnail_path,
+    }
+    try:
+        thumbnail.save(thumbnail_path)
+        with open(f"{date_dir}/{EVENT_LOG_FILE}", 'a') as f:
+            f.write(json.dumps(event) + '\n')
+    except Exception as e:
+        logger.error(f"Error saving event for {robot_id}: {e}")
+    
+    with event_log_lock:
+        event_log.append(event)
+    logger.info(f"Event {event_type} on {robot_id}: {metrics}")
+
+def load_events():
+    """Load recent events from the event logs in the daily folders"""
+    global next_event_id
+    events = []
+    try:
+        date_dirs = sorted(item for item in os.listdir('.') if len(item) == 8 and item.isdigit())
+    except OSError as e:
+        logger.error(f"Error listing event folders: {e}")
+        date_dirs = []
+    
+    for date_dir in date_dirs:
+        path = f"{date_dir}/{EVENT_LOG_FILE}"
+        if not os.path.exists(path):
+            continue
+        try:
+            with open(path, 'r') as f:
+                for line in f:
+                    if not line.strip():
+                        continue
+                    # A killed process can leave a partial last line; skip just that line
+                    try:
+                        events.append(json.loads(line))
+                    except json.JSONDecodeError:
+                        logger.warning(f"Skipping damaged event line in {path}")
+        except OSError as e:
+            logger.error(f"Error loading events from {path}: {e}")
+    
+    with event_log_lock:
+        event_log.extend(events[-EVENT_LOG_SIZE:])
+        # Take the highest id from every parsed event so new ids never repeat saved ones
+        ids = [event['id'] for event in events if isinstance(event, dict) and 'id' in event]
+        if ids:
+            next_event_id = max(next_event_id, max(ids) + 1)
+    logger.info(f"Loaded {len(event_log)} events")
+
+def get_events(robot_id=None, event_type=None, since=None, limit=100):
+    """Query the event log, newest first"""
+    with event_log_lock:
+        events = list(event_log)
+    
+    result = []
+    for event in reversed(events):
+        if since and event['time'] < since:
+            break
+        if robot_id and event['robot_id'] != robot_id:
+            continue
+        if event_type and event['type'] != event_type:
+            continue
+        result.append(event)
+        if len(result) >= limit:
+            break
+    return result
+
+def analyze_frame(robot_id, image):
+    """Compute motion, brightness and blur metrics for a frame and emit events"""
+    global analysis_cycle_cpu
+    if robot_id not in ANALYSIS_ROBOTS:
+        return
+    if analysis_cycle_cpu >= ANALYSIS_CPU_BUDGET:
+        logger.debug(f"Skipping analysis for {robot_id}: cycle CPU budget used")
+        return
+    
+    cpu_start = time.thread_time()
+    try:
+        # Pillow's image ops run in C over the whole frame, so no per-pixel Python
+        thumbnail = image.convert('RGB').resize(ANALYSIS_SIZE)
+        gray = thumbnail.convert('L')
+        
+        state = analysis_state.setdefault(robot_id, {'previous': None, 'active': set()})
+        motion = 0.0
+        if state['previous'] is not None:
+            motion = ImageStat.Stat(ImageChops.difference(gray, state['previous'])).mean[0] / 255
+        brightness = ImageStat.Stat(gray).mean[0]
+        sharpness = ImageStat.Stat(gray.filter(ImageFilter.FIND_EDGES)).stddev[0]
+        state['previous'] = gray
+        
+        metrics = {
+            'motion': round(motion, 4),
+            'brightness': round(brightness, 1),
+            'sharpness': round(sharpness, 2),
+        }
+        state['metrics'] = metrics
+        
+        conditions = set()
+        if motion > MOTION_THRESHOLD:
+            conditions.add('motion')
+        if brightness < DARK_THRESHOLD:
+            conditions.add('dark')
+        elif sharpness < BLUR_THRESHOLD:
+            conditions.add('blur')
+        
+        # Only emit when a condition starts, not on every frame it lasts
+        for event_type in sorted(conditions - state['active']):
+            record_event(robot_id, event_type, metrics, thumbnail)
+        state['active'] = conditions
+    except Exception as e:
+        logger.error(f"Error analyzing frame from {robot_id}: {e}")
+    finally:
+        analysis_cycle_cpu += time.thread_time() - cpu_start
+
+# Capture recording and replay (raw robot responses, gzip-compressed JSON lines)
+recording_file = None
+recording_start = None
+recording_lock = threading.Lock()
+replay_responses = None  # robot_id -> deque of recorded responses while replaying
+replay_realtime = False  # Sleep for each recorded request time while replaying
+capture_cycle = 0
+
+def start_recording(path):
+    """Start a new replay file, replacing any earlier recording at that path"""
+    global recording_file, recording_start
+    # A fresh file per session, so cycle numbers and offsets never mix between runs
+    recording_file = gzip.open(path, 'wt', encoding='utf-8')
+    recording_start = time.time()
+    
+    # Close cleanly on exit and on SIGTERM so the gzip stream gets its end marker
+    atexit.register(stop_recording)
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    logger.info(f"Recording robot responses to {path}")
+
+def flush_recording():
+    """Flush recorded responses to disk"""
+    with recording_lock:
+        if recording_file is not None:
+            recording_file.flush()
+
+def stop_recording():
+    """Close the replay file"""
+    global recording_file
+    with recording_lock:
+        if recording_file is not None:
+            recording_file.close()
+            recording_file = None
+            logger.info("Closed recording")
+
+def record_response(robot_id, url, started, response=None, error=None):
+    """Write one robot response (or failed request) to the replay file"""
+    record = {
+        'cycle': capture_cycle,
+        't': round(started - recording_start, 3),
+        'robot_id': robot_id,
+        'url': url,
+        'elapsed': round(time.time() - started, 3),
+        'status': response.status_code if response is not None else None,
+        'payload': response.text if response is not None else None,
+        'error': str(error) if error is not None else None,
+    }
+    try:
+        with recording_lock:
+            if recording_file is not None:
+                recording_file.write(json.dumps(record) + '\n')
+    except Exception as e:
+        logger.error(f"Error recording response from {robot_id}: {e}")
+
+def replay_response(robot_id, url):
+    """Return the next recorded response for a robot as a requests.Response"""
+    records = replay_responses.get(robot_id)
+    if not records:
+        raise requests.RequestException(f"No recorded response for {robot_id}")
+    record = records.popleft()
+    if replay_realtime and record['elapsed']:
+        # Reproduce slow and timing-out robots
+        time.sleep(record['elapsed'])
+    if record['error'] is not None:
+        raise requests.RequestException(record['error'])
+    
+    response = requests.Response()
+    response.status_code = record['status']
+    response._content = record['payload'].encode('utf-8')
+    response.encoding = 'utf-8'
+    response.url = url
+    return response
+
+def fetch_robot_response(robot_id, url):
+    """Fetch a robot's image response, recording or replaying it when enabled"""
+    if replay_responses is not None:
+        return replay_response(robot_id, url)
+    
+    started = time.time()
+    try:
+        response = requests.get(url, timeout=5)
+    except Exception as e:
+        if recording_file is not None:
+            record_response(robot_id, url, started, error=e)
+        raise
+    if recording_file is not None:
+        record_response(robot_id, url, started, response)
+    return response
+
+def load_recording(path):
+    """Load a replay file as a list of (start offset, responses per robot) cycles"""
+    cycles = {}
+    try:
+        with gzip.open(path, 'rt', encoding='utf-8') as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                record = json.loads(line)
+                responses = cycles.setdefault(record['cycle'], (record['t'], defaultdict(deque)))[1]
+                responses[record['robot_id']].append(record)
+    except (EOFError, gzip.BadGzipFile, zlib.error, json.JSONDecodeError) as e:
+        # A recorder that was killed leaves a truncated tail; keep the complete records
+        logger.warning(f"Recording {path} is truncated, replaying the complete records: {e}")
+    return [cycles[cycle] for cycle in sorted(cycles)]
+
+def replay_recording(path, fast=False):
+    """Feed a recording through the capture pipeline and report its throughput
+    
+    Runs inside a temporary directory, so the archive, state files and folder
+    retention never touch the live data in the current directory.
+    """
+    global replay_responses, replay_realtime
+    cycles = load_recording(path)
+    if not cycles:
+        logger.error(f"No recorded cycles in {path}")
+        return None
+    
+    original_dir = os.getcwd()
+    with tempfile.TemporaryDirectory(prefix='replay_') as replay_dir:
+        os.chdir(replay_dir)
+        replay_realtime = not fast
+        try:
+            return run_replay(cycles, fast)
+        finally:
+            replay_responses = None
+            replay_realtime = False
+            os.chdir(original_dir)
+
+def run_replay(cycles, fast):
+    """Run recorded cycles through create_combined_image() and time them"""
+    global replay_responses
+    
+    # Fixed seed so the occasional error count cleanup happens on the same cycles
+    random.seed(0)
+    first_offset = cycles[0][0]
+    replay_start = time.perf_counter()
+    cycle_seconds = []
+    
+    for offset, responses in cycles:
+        if not fast:
+            # Keep the recorded spacing between cycles
+            delay = (offset - first_offset) - (time.perf_counter() - replay_start)
+            if delay > 0:
+                time.sleep(delay)
+        replay_responses = responses
+        cycle_start = time.perf_counter()
+        create_combined_image()
+        cycle_seconds.append(time.perf_counter() - cycle_start)
+    
+    total = time.perf_counter() - replay_start
+    stats = {
+        'cycles': len(cycle_seconds),
+        'total_seconds': round(total, 3),
+        'cycles_per_second': round(len(cycle_seconds) / total, 2) if total else None,
+        'mean_cycle_ms': round(sum(cycle_seconds) * 1000 / len(cycle_seconds), 2),
+        'max_cycle_ms': round(max(cycle_seconds) * 1000, 2),
+    }
+    logger.info(f"Replay finished: {stats}")
+    return stats
+
 def get_robot_image_old(robot_id, url): #### to be confirmed to delete
     """Fetch and process image from a robot"""
     try:
@@ -259,7 +947,7 @@ def get_robot_image(robot_id, url):
     previous_state = getattr(get_robot_image, "previous_states", {}).get(robot_id, "success")
     
     try:
-        response = requests.get(url, timeout=5)
+        response = fetch_robot_response(robot_id, url)
         response.raise_for_status()
         data = response.json()
         
@@ -290,12 +978,19 @@ def get_robot_image(robot_id, url):
         image_bytes = base64.b64decode(base64_data)
         image = Image.open(BytesIO(image_bytes))
         
+        # Track when the frame was captured, fetched and last changed
+        capture_time = parse_capture_time(data)
+        update_frame_metadata(robot_id, image_bytes, capture_time)
+        
+        # Look for motion and camera problems before the overlay is drawn
+        analyze_frame(robot_id, image)
+        
         # Get error count for this robot
         error_count = get_error_count(robot_id)
         
         # Add timestamp, robot ID, and error count to image
         draw = ImageDraw.Draw(image)
-        timestamp = datetime.now().strftime("%Y-%m-%d_%H:%M:%S")
+        timestamp = (capture_time or datetime.now()).strftime("%Y-%m-%d_%H:%M:%S")
         text = f"{robot_id.upper()}_{timestamp} (Errors: {error_count})"
         
         # Create a black background rectangle for text
@@ -323,6 +1018,11 @@ def get_robot_image(robot_id, url):
         # Save individual image
         filename = f"{date_dir}/{robot_id.upper()}_{datetime.now().strftime('%Y-%m-%d_%H-%M-%S')}.jpg"
         image.save(filename)
+        last_archived_frames[robot_id] = filename
+        
+        # Close the outage if the robot just recovered
+        if previous_state == "error":
+            record_outage_end(robot_id)
         
         # Update previous state to success
         if not hasattr(get_robot_image, "previous_states"):
@@ -337,10 +1037,12 @@ def get_robot_image(robot_id, url):
         
     except Exception as e:
         logger.error(f"Error getting image from {robot_id}: {e}")
+        update_frame_metadata(robot_id, error=str(e))
         
         # Only record error if previous state was success
         if previous_state == "success":
             record_error(robot_id)
+            record_outage_start(robot_id)
         
         # Update previous state to error
         if not hasattr(get_robot_image, "previous_states"):
@@ -362,20 +1064,29 @@ def get_robot_image(robot_id, url):
             draw.text((50, 220), f"Total errors (7 days): {error_count}", fill="red")
         return error_img, str(e)
     
-def create_combined_image():
-    """Create a combined 2x2 image from all robot images"""
-    global latest_combined_image, latest_combined_image_path
+def draw_staleness_indicator(combined, robot_id, pos, size):
+    """Outline a robot's tile and label its age when its frame has stopped changing"""
+    status = get_frame_status(robot_id)
+    if not status['stale']:
+        return
     
-    # Clean up old folders (runs once per day)
-    delete_old_folders()
-    
-    images = {}
-    errors = {}
-    
-    # Get images from all robots
-    for robot_id, url in ROBOTS.items():
-        images[robot_id], errors[robot_id] = get_robot_image(robot_id, url)
+    x, y = pos
+    width, height = size
+    draw = ImageDraw.Draw(combined)
+    draw.rectangle([x, y, x + width - 1, y + height - 1], outline="red", width=4)
     
+    if status['unchanged_for'] is None:
+        text = f"{robot_id.upper()} STALE: no frame yet"
+    else:
+        text = f"{robot_id.upper()} STALE: unchanged for {int(status['unchanged_for'])}s"
+    bbox = draw.textbbox((0, 0), text)
+    text_height = bbox[3] - bbox[1]
+    text_y = y + height - text_height - 15
+    draw.rectangle([x + 5, text_y - 5, x + 15 + bbox[2] - bbox[0], text_y + text_height + 5], fill="red")
+    draw.text((x + 10, text_y), text, fill="white")
+
+def compose_combined_image(images):
+    """Arrange robot images in a 2x2 grid"""
     # Create a 2x2 grid
     width, height = 640, 480  # Default size
     if images and list(images.values())[0]:
@@ -394,19 +1105,248 @@ def create_combined_image():
     for i, (robot_id, pos) in enumerate(zip(ROBOTS.keys(), positions)):
         if robot_id in images and images[robot_id]:
             combined.paste(images[robot_id], pos)
+            draw_staleness_indicator(combined, robot_id, pos, (width, height))
+    
+    return combined
+
+# Encoding profiles for /latest_image, each encoded at most once per frame generation
+ENCODING_PROFILES = {
+    'jpeg-high': {'format': 'JPEG', 'mimetype': 'image/jpeg', 'quality': 90, 'scale': 1.0},
+    'jpeg': {'format': 'JPEG', 'mimetype': 'image/jpeg', 'quality': 75, 'scale': 1.0},  # Same as the archive
+    'jpeg-medium': {'format': 'JPEG', 'mimetype': 'image/jpeg', 'quality': 55, 'scale': 1.0},
+    'jpeg-low': {'format': 'JPEG', 'mimetype': 'image/jpeg', 'quality': 45, 'scale': 0.5},
+    'webp': {'format': 'WEBP', 'mimetype': 'image/webp', 'quality': 70, 'scale': 1.0},
+    'webp-low': {'format': 'WEBP', 'mimetype': 'image/webp', 'quality': 50, 'scale': 0.5},
+}
+DEFAULT_PROFILE = 'jpeg'
+WEBP_PROFILE = 'webp'  # Used when the client's Accept header allows WebP
+WEBP_SUPPORTED = features.check('webp')
+if not WEBP_SUPPORTED:
+    ENCODING_PROFILES = {name: settings for name, settings in ENCODING_PROFILES.items()
+                         if settings['format'] != 'WEBP'}
+encoding_stats = defaultdict(lambda: {'encodes': 0, 'encode_seconds': 0.0, 'bytes': 0, 'served': 0})
+encode_lock = threading.Lock()
+
+def record_encode(profile, seconds, size):
+    """Record the cost and output size of one encode"""
+    stats = encoding_stats[profile]
+    stats['encodes'] += 1
+    stats['encode_seconds'] += seconds
+    stats['bytes'] += size
+
+def encode_image(image, profile, record_stats=True):
+    """Encode an image with an encoding profile"""
+    settings = ENCODING_PROFILES[profile]
+    start = time.perf_counter()
+    if settings['scale'] != 1.0:
+        width, height = image.size
+        image = image.resize((int(width * settings['scale']), int(height * settings['scale'])))
+    image_io = BytesIO()
+    image.save(image_io, settings['format'], quality=settings['quality'])
+    data = image_io.getvalue()
+    if record_stats:
+        with encode_lock:
+            record_encode(profile, time.perf_counter() - start, len(data))
+    return data
+
+def get_frame_encoding(frame, profile):
+    """Get a frame encoded with a profile, encoding it on first request"""
+    data = frame.encodings.get(profile)
+    if data is None:
+        # Encode under a lock so concurrent clients share one encode per generation
+        with frame.encode_lock:
+            data = frame.encodings.get(profile)
+            if data is None:
+                data = encode_image(frame.image, profile)
+                frame.encodings[profile] = data
+    # next() on itertools.count is atomic, so counting a serve takes no lock
+    next(frame.served[profile])
+    return data
+
+def fold_served_counts(frame):
+    """Add a retired frame's served counts to the encoding stats"""
+    with encode_lock:
+        for profile, counter in frame.served.items():
+            # The counter starts at 1, so the next value is one more than the serves
+            served = next(counter) - 1
+            if served:
+                encoding_stats[profile]['served'] += served
+
+def choose_profile():
+    """Pick an encoding profile from the profile query parameter or the Accept header"""
+    profile = request.args.get('profile')
+    if profile:
+        return profile
+    # Only when WebP is listed explicitly; */* clients keep getting JPEG
+    if WEBP_SUPPORTED and 'image/webp' in request.accept_mimetypes.values():
+        return WEBP_PROFILE
+    return DEFAULT_PROFILE
+
+def get_encoding_stats():
+    """Get per-profile encode counts, mean encode time and mean output size
+    
+    Served counts are added when a frame is replaced, so they trail by one generation.
+    """
+    with encode_lock:
+        stats = {profile: dict(values) for profile, values in encoding_stats.items()}
+    for profile, values in stats.items():
+        encodes = values['encodes']
+        values['mean_encode_ms'] = round(values['encode_seconds'] * 1000 / encodes, 2) if encodes else None
+        values['mean_bytes'] = round(values['bytes'] / encodes) if encodes else None
+        values['encode_seconds'] = round(values['encode_seconds'], 3)
+    return stats
+
+def publish_frame(combined, jpeg, path):
+    """Publish a new frame snapshot for readers"""
+    global current_frame
+    metadata = {robot_id: copy_frame_metadata(robot_id) for robot_id in ROBOTS}
+    counts = {robot_id: get_error_count(robot_id) for robot_id in ROBOTS}
+    
+    served = {profile: itertools.count(1) for profile in ENCODING_PROFILES}
+    
+    with frame_publish_lock:
+        previous = current_frame
+        generation = previous.generation + 1 if previous else 1
+        # A single reference assignment, so readers see the old or new snapshot, never a mix
+        current_frame = FrameSnapshot(generation, combined, path, datetime.now(), metadata, counts,
+                                      {DEFAULT_PROFILE: jpeg}, threading.Lock(), served)
+    
+    if previous is not None:
+        fold_served_counts(previous)
+
+def get_current_frame():
+    """Get the latest published frame snapshot, or None before the first frame"""
+    return current_frame
+
+def save_combined_image(combined):
+    """Save a combined image to the daily folder and publish it as the latest"""
+    # Encode once; the same bytes go to the archive and to readers
+    jpeg = encode_image(combined, DEFAULT_PROFILE)
     
     # Save combined image
     date_dir = datetime.now().strftime("%Y%m%d")
     os.makedirs(date_dir, exist_ok=True)
     filename = f"{date_dir}/combined_{datetime.now().strftime('%Y-%m-%d_%H-%M-%S')}.jpg"
-    combined.save(filename)
+    with open(filename, 'wb') as f:
+        f.write(jpeg)
+    
+    publish_frame(combined, jpeg, filename)
+    return filename
+
+def create_combined_image():
+    """Create a combined 2x2 image from all robot images"""
+    global capture_cycle
+    capture_cycle += 1
+    
+    # Clean up old folders (runs once per day)
+    delete_old_folders()
+    robot_order = start_analysis_cycle()
+    
+    images = {}
+    errors = {}
+    
+    # Get images from all robots, in the rotated analysis order
+    for robot_id in robot_order:
+        images[robot_id], errors[robot_id] = get_robot_image(robot_id, ROBOTS[robot_id])
     
-    # Update global variables
-    latest_combined_image = combined
-    latest_combined_image_path = filename
+    # Put the images back in grid order
+    images = {robot_id: images[robot_id] for robot_id in ROBOTS}
+    
+    filename = save_combined_image(compose_combined_image(images))
+    save_snapshot(filename)
+    flush_recording()
     
     logger.info(f"Updated combined image at {datetime.now().strftime('%H:%M:%S')}")
 
+# Warm start from the last archived frames
+WARM_START = True  # Serve last-known frames at startup instead of waiting for a capture
+SNAPSHOT_FILE = "snapshot.json"
+last_archived_frames = {}
+
+def save_snapshot(combined_path):
+    """Record the paths of the latest archived frames for the next warm start"""
+    snapshot = {'robots': dict(last_archived_frames), 'combined': combined_path}
+    try:
+        # Write to a temporary file first so a crash never leaves a partial snapshot
+        with open(SNAPSHOT_FILE + '.tmp', 'w') as f:
+            json.dump(snapshot, f)
+        os.replace(SNAPSHOT_FILE + '.tmp', SNAPSHOT_FILE)
+    except Exception as e:
+        logger.error(f"Error saving snapshot: {e}")
+
+def find_archived_frames():
+    """Find the newest archived frame for each robot, from the snapshot or the daily folders"""
+    frames = {}
+    try:
+        if os.path.exists(SNAPSHOT_FILE):
+            with open(SNAPSHOT_FILE, 'r') as f:
+                snapshot = json.load(f)
+            for robot_id, path in snapshot.get('robots', {}).items():
+                if robot_id in ROBOTS and os.path.exists(path):
+                    frames[robot_id] = path
+    except Exception as e:
+        logger.error(f"Error loading snapshot: {e}")
+    
+    missing = [robot_id for robot_id in ROBOTS if robot_id not in frames]
+    if not missing:
+        return frames
+    
+    # Fall back to scanning the daily folders, newest first
+    try:
+        date_dirs = sorted((item for item in os.listdir('.')
+                            if os.path.isdir(item) and len(item) == 8 and item.isdigit()), reverse=True)
+        for date_dir in date_dirs:
+            # File names embed the timestamp, so the newest sorts last
+            for name in sorted(os.listdir(date_dir), reverse=True):
+                for robot_id in list(missing):
+                    if name.startswith(f"{robot_id.upper()}_") and name.endswith('.jpg'):
+                        frames[robot_id] = f"{date_dir}/{name}"
+                        missing.remove(robot_id)
+            if not missing:
+                break
+    except Exception as e:
+        logger.error(f"Error scanning archived frames: {e}")
+    
+    return frames
+
+def seed_from_archive():
+    """Publish a combined image built from the last archived frame of each robot"""
+    images = {}
+    for robot_id, path in find_archived_frames().items():
+        try:
+            image = Image.open(path)
+            image.load()
+            images[robot_id] = image
+            last_archived_frames[robot_id] = path
+            # Seed the frame times from the file so the tile is flagged as stale
+            mtime = datetime.fromtimestamp(os.path.getmtime(path))
+            with frame_metadata_lock:
+                frame_metadata[robot_id] = {
+                    'capture_time': None,
+                    'fetched_at': mtime,
+                    'changed_at': mtime,
+                    'image_crc': None,
+                    'error': None,
+                }
+        except Exception as e:
+            logger.error(f"Error loading archived frame {path}: {e}")
+    
+    if not images:
+        logger.info("No archived frames found for warm start")
+        return
+    
+    # Keep the grid order and fill robots without an archive with a placeholder
+    size = list(images.values())[0].size
+    for robot_id in ROBOTS:
+        if robot_id not in images:
+            images[robot_id] = Image.new('RGB', size, color='gray')
+    images = {robot_id: images[robot_id] for robot_id in ROBOTS}
+    
+    # Publish without archiving; the archive already holds these frames
+    combined = compose_combined_image(images)
+    publish_frame(combined, encode_image(combined, DEFAULT_PROFILE, record_stats=False), None)
+    logger.info(f"Seeded combined image from {len(last_archived_frames)} archived frames")
+
 def update_images_periodically():
     """Periodically update images every 10 seconds"""
     while True:
@@ -416,22 +1356,105 @@ def update_images_periodically():
             logger.error(f"Error in update thread: {e}")
         time.sleep(10)
 
+# Rendered page cache and response compression
+PAGE_CACHE_MAX_ENTRIES = 256
+COMPRESS_MIN_SIZE = 1024
+COMPRESSIBLE_MIMETYPES = ('text/html', 'text/css', 'text/plain', 'application/javascript', 'application/json', 'image/svg+xml')
+STATIC_MAX_AGE = 86400
+page_cache = {}
+page_cache_lock = threading.Lock()
+
+def choose_encoding():
+    """Pick the best content encoding the client accepts"""
+    if brotli is not None and request.accept_encodings['br']:
+        return 'br'
+    if request.accept_encodings['gzip']:
+        return 'gzip'
+    return None
+
+def compress_body(body, encoding):
+    """Compress a response body with gzip or brotli"""
+    if encoding == 'br':
+        return brotli.compress(body)
+    return gzip.compress(body, compresslevel=6)
+
+def cached_page(key, render):
+    """Serve a rendered page from the cache, calling render() only on a miss"""
+    with page_cache_lock:
+        entry = page_cache.get(key)
+    
+    if entry is None:
+        body = render().encode('utf-8')
+        entry = {'identity': body, 'etag': hashlib.sha1(body).hexdigest()}
+        with page_cache_lock:
+            # Drop the oldest entry; stale data versions age out this way
+            if len(page_cache) >= PAGE_CACHE_MAX_ENTRIES:
+                page_cache.pop(next(iter(page_cache)))
+            page_cache[key] = entry
+    
+    if entry['etag'] in request.if_none_match:
+        response = Response(status=304)
+    else:
+        encoding = choose_encoding() if len(entry['identity']) >= COMPRESS_MIN_SIZE else None
+        if encoding:
+            # Each encoding is compressed once per cached page
+            if encoding not in entry:
+                entry[encoding] = compress_body(entry['identity'], encoding)
+            response = Response(entry[encoding], mimetype='text/html')
+            response.headers['Content-Encoding'] = encoding
+        else:
+            response = Response(entry['identity'], mimetype='text/html')
+    
+    response.set_etag(entry['etag'])
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    response.vary.add('Accept-Encoding')
+    return response
+
+@app.after_request
+def compress_response(response):
+    """Add cache headers to static assets and compress text responses"""
+    if request.endpoint == 'static':
+        response.cache_control.public = True
+        response.cache_control.max_age = STATIC_MAX_AGE
+        response.direct_passthrough = False
+    
+    if (response.status_code != 200 or response.direct_passthrough
+            or 'Content-Encoding' in response.headers
+            or response.mimetype not in COMPRESSIBLE_MIMETYPES):
+        return response
+    
+    body = response.get_data()
+    encoding = choose_encoding()
+    if encoding and len(body) >= COMPRESS_MIN_SIZE:
+        response.set_data(compress_body(body, encoding))
+        response.headers['Content-Encoding'] = encoding
+        response.vary.add('Accept-Encoding')
+    return response
+
 @app.route('/login', methods=['GET', 'POST'])
 def login():
     if request.method == 'POST':
+        client_ip = request.remote_addr
+        
+        # Reject before hashing anything so a flood of bad logins stays cheap
+        if not reserve_login_attempt(client_ip):
+            logger.warning(f"Login rate limit hit for {client_ip}")
+            return render_template('login.html', error='Too many failed attempts, try again later'), 429
+        
         username = request.form['username']
         password = request.form['password']
         
-        users = load_users()
-        
-        if username in users and users[username] == password:
+        if verify_user(username, password):
+            clear_failed_logins(client_ip)
             session['logged_in'] = True
             session['username'] = username
             return redirect(url_for('index'))
         else:
+            # The reserved attempt stays counted as a failure
             return render_template('login.html', error='Invalid credentials')
     
-    return render_template('login.html')
+    return cached_page(('login.html',), lambda: render_template('login.html'))
 
 @app.route('/logout')
 def logout():
@@ -442,15 +1465,27 @@ def logout():
 @app.route('/')
 @login_required
 def index():
-    return render_template('index.html', username=session.get('username'))
+    username = session.get('username')
+    return cached_page(('index.html', username),
+                       lambda: render_template('index.html', username=username))
 
 @app.route('/latest_image')
 @login_required
 def get_latest_image():
     """Serve the latest combined image"""
     try:
-        if latest_combined_image_path and os.path.exists(latest_combined_image_path):
-            return send_file(latest_combined_image_path, mimetype='image/jpeg')
+        # Served from memory, so retention deleting the archived file cannot race this
+        frame = get_current_frame()
+        if frame is not None:
+            profile = choose_profile()
+            if profile not in ENCODING_PROFILES:
+                return f"Unknown profile: {profile}", 400
+            response = Response(get_frame_encoding(frame, profile),
+                                mimetype=ENCODING_PROFILES[profile]['mimetype'])
+            response.headers['X-Frame-Generation'] = str(frame.generation)
+            response.headers['X-Encoding-Profile'] = profile
+            response.vary.add('Accept')
+            return response
         else:
             # Return a placeholder if no image is available
             img = Image.new('RGB', (640, 480), color='gray')
@@ -470,25 +1505,110 @@ def get_latest_image():
         logger.error(f"Error serving image: {e}")
         return str(e), 500
 
+@app.route('/encoding_stats')
+@login_required
+def encoding_stats_api():
+    """Return per-profile encode cost and output size as JSON"""
+    return jsonify(get_encoding_stats())
+
+@app.route('/frame_status')
+@login_required
+def frame_status():
+    """Return per-robot frame timestamps and staleness as JSON"""
+    frame = get_current_frame()
+    
+    # Report the published frame so the status matches the image being served;
+    # before the first frame the same fields are returned with nulls
+    robots = {}
+    for robot_id in ROBOTS.keys():
+        if frame is None:
+            robots[robot_id] = get_frame_status(robot_id)
+            robots[robot_id]['error_count'] = None
+        else:
+            robots[robot_id] = get_frame_status(robot_id, frame.metadata[robot_id])
+            robots[robot_id]['error_count'] = frame.error_counts[robot_id]
+    
+    return jsonify({
+        'generation': frame.generation if frame is not None else None,
+        'published_at': frame.published_at.isoformat() if frame is not None else None,
+        'robots': robots,
+    })
+
 @app.route('/error_stats')
 @login_required
 def error_stats():
     """Display error statistics for all robots"""
-    stats = {}
-    for robot_id in ROBOTS.keys():
-        stats[robot_id] = get_error_count(robot_id)
+    username = session.get('username')
+    
+    # Counts come from the published frame, never from the live error_counts the
+    # capture thread is changing; empty until the first frame is published
+    frame = get_current_frame()
+    
+    def render():
+        stats = dict(frame.error_counts) if frame is not None else {}
+        return render_template('error_stats.html', 
+                              stats=stats, 
+                              username=username)
+    
+    generation = frame.generation if frame is not None else None
+    return cached_page(('error_stats.html', username, generation), render)
+
+@app.route('/api/events')
+@login_required
+def events_api():
+    """Return motion and camera events as JSON, newest first"""
+    try:
+        limit = max(1, min(int(request.args.get('limit', 100)), EVENT_LOG_SIZE))
+    except ValueError:
+        return jsonify({'error': 'limit must be an integer'}), 400
+    events = get_events(robot_id=request.args.get('robot'),
+                        event_type=request.args.get('type'),
+                        since=request.args.get('since'),
+                        limit=limit)
+    return jsonify([dict(event, thumbnail_url=url_for('event_thumbnail', event_id=event['id']))
+                    for event in events])
+
+@app.route('/events/<int:event_id>/thumbnail')
+@login_required
+def event_thumbnail(event_id):
+    """Serve the thumbnail saved with an event"""
+    with event_log_lock:
+        event = next((e for e in event_log if e['id'] == event_id), None)
+    if event is None or not os.path.exists(event['thumbnail']):
+        return "Event thumbnail not found", 404
+    return send_file(event['thumbnail'], mimetype='image/jpeg')
+
+@app.route('/api/error_analytics')
+@login_required
+def error_analytics_api():
+    """Return error trends, MTBF and outage durations as JSON"""
+    resolution = request.args.get('resolution', 'daily')
+    if resolution not in ('daily', 'hourly'):
+        return jsonify({'error': 'resolution must be daily or hourly'}), 400
+    try:
+        days = int(request.args.get('days', 30))
+    except ValueError:
+        return jsonify({'error': 'days must be an integer'}), 400
+    max_days = HOURLY_RETENTION_DAYS if resolution == 'hourly' else DAILY_RETENTION_DAYS
+    days = max(1, min(days, max_days))
     
-    return render_template('error_stats.html', 
-                          stats=stats, 
-                          username=session.get('username'))
+    robot_ids = [request.args['robot']] if 'robot' in request.args else list(ROBOTS.keys())
+    return jsonify({robot_id: get_error_analytics(robot_id, days, resolution) for robot_id in robot_ids})
+
+@app.route('/error_analytics')
+@login_required
+def error_analytics_page():
+    """Display error trend charts for all robots"""
+    username = session.get('username')
+    return cached_page(('error_analytics.html', username),
+                       lambda: render_template('error_analytics.html', username=username))
 
-# Create templates if they don't exist
-if not os.path.exists('templates'):
-    os.makedirs('templates')
+# Templates are kept in memory and compiled once by Jinja, so nothing is
+# written to disk at startup
+TEMPLATES = {}
 
-# Create login template
-with open('templates/login.html', 'w', encoding='utf-8') as f:
-    f.write('''
+# Login template
+TEMPLATES['login.html'] = '''
 <!DOCTYPE html>
 <html lang="en">
 <head>
@@ -572,11 +1692,10 @@ with open('templates/login.html', 'w', encoding='utf-8') as f:
     </div>
 </body>
 </html>
-''')
+'''
 
-# Create index template
-with open('templates/index.html', 'w', encoding='utf-8') as f:
-    f.write('''
+# Index template
+TEMPLATES['index.html'] = '''
 <!DOCTYPE html>
 <html lang="en">
 <head>
@@ -675,6 +1794,7 @@ with open('templates/index.html', 'w', encoding='utf-8') as f:
     <div class="nav">
         <a href="{{ url_for('index') }}">Live View</a>
         <a href="{{ url_for('error_stats') }}">Error Statistics</a>
+        <a href="{{ url_for('error_analytics_page') }}">Error Analytics</a>
     </div>
     
     <div class="container">
@@ -685,6 +1805,7 @@ with open('templates/index.html', 'w', encoding='utf-8') as f:
         <div class="last-updated" id="lastUpdated">
             Last updated: <span id="updateTime">Loading...</span>
         </div>
+        <div class="last-updated" id="frameStatus"></div>
         <div class="image-container">
             <img id="robotImage" src="{{ url_for('get_latest_image') }}" alt="Robot Camera Feed">
         </div>
@@ -694,10 +1815,28 @@ with open('templates/index.html', 'w', encoding='utf-8') as f:
         function updateImage() {
             const img = document.getElementById('robotImage');
             // Add a timestamp to the URL to prevent caching
-            img.src = "{{ url_for('get_latest_image') }}?" + new Date().getTime();
+            // Pass an encoding profile from the page URL through, e.g. /?profile=jpeg-low
+            const profile = new URLSearchParams(window.location.search).get('profile');
+            img.src = "{{ url_for('get_latest_image') }}?" + (profile ? "profile=" + encodeURIComponent(profile) + "&" : "") + new Date().getTime();
             
             // Update the timestamp display
             document.getElementById('updateTime').textContent = new Date().toLocaleTimeString();
+            
+            updateFrameStatus();
+        }
+        
+        function updateFrameStatus() {
+            fetch("{{ url_for('frame_status') }}")
+                .then(response => response.json())
+                .then(status => {
+                    const parts = [];
+                    for (const [robotId, s] of Object.entries(status.robots)) {
+                        const age = s.frame_age === null ? 'n/a' : s.frame_age + 's';
+                        parts.push(robotId.toUpperCase() + ': ' + age + (s.stale ? ' (STALE)' : ''));
+                    }
+                    document.getElementById('frameStatus').textContent = 'Frame age: ' + parts.join(' | ');
+                })
+                .catch(() => {});
         }
         
         // Update the image every 10 seconds
@@ -708,13 +1847,10 @@ with open('templates/index.html', 'w', encoding='utf-8') as f:
     </script>
 </body>
 </html>
-''')
-
-# Replace the error_stats.html template creation section with this code:
+'''
 
-# Create error statistics template
-with open('templates/error_stats.html', 'w', encoding='utf-8') as f:
-    f.write('''
+# Error statistics template
+TEMPLATES['error_stats.html'] = '''
 <!DOCTYPE html>
 <html lang="en">
 <head>
@@ -812,6 +1948,7 @@ with open('templates/error_stats.html', 'w', encoding='utf-8') as f:
     <div class="nav">
         <a href="{{ url_for('index') }}">Live View</a>
         <a href="{{ url_for('error_stats') }}">Error Statistics</a>
+        <a href="{{ url_for('error_analytics_page') }}">Error Analytics</a>
     </div>
     
     <div class="container">
@@ -856,14 +1993,202 @@ with open('templates/error_stats.html', 'w', encoding='utf-8') as f:
     </div>
 </body>
 </html>
-''')
+'''
+
+# Error analytics template
+TEMPLATES['error_analytics.html'] = '''
+<!DOCTYPE html>
+<html lang="en">
+<head>
+    <meta charset="UTF-8">
+    <meta name="viewport" content="width=device-width, initial-scale=1.0">
+    <title>Error Analytics - Robot Camera Monitor</title>
+    <style>
+        body {
+            font-family: Arial, sans-serif;
+            margin: 0;
+            padding: 20px;
+            background-color: #f0f0f0;
+        }
+        .header {
+            display: flex;
+            justify-content: space-between;
+            align-items: center;
+            margin-bottom: 20px;
+        }
+        .container {
+            max-width: 1000px;
+            margin: 0 auto;
+            background-color: white;
+            padding: 20px;
+            border-radius: 8px;
+            box-shadow: 0 2px 10px rgba(0, 0, 0, 0.1);
+        }
+        h1 {
+            text-align: center;
+            color: #333;
+            margin: 0;
+        }
+        .user-info {
+            text-align: right;
+            color: #666;
+        }
+        .logout-btn {
+            background-color: #f44336;
+            color: white;
+            border: none;
+            padding: 8px 16px;
+            border-radius: 4px;
+            cursor: pointer;
+            text-decoration: none;
+            display: inline-block;
+        }
+        .logout-btn:hover {
+            background-color: #d32f2f;
+        }
+        .nav {
+            margin-bottom: 20px;
+            text-align: center;
+        }
+        .nav a {
+            margin: 0 10px;
+            text-decoration: none;
+            color: #2196F3;
+        }
+        .nav a:hover {
+            text-decoration: underline;
+        }
+        .controls {
+            margin-bottom: 20px;
+        }
+        .robot-chart {
+            margin-bottom: 30px;
+        }
+        .summary {
+            color: #666;
+            margin: 5px 0 10px 0;
+        }
+        canvas {
+            width: 100%;
+            height: 160px;
+            border: 1px solid #ddd;
+            border-radius: 4px;
+        }
+    </style>
+</head>
+<body>
+    <div class="header">
+        <h1>Robot Error Analytics</h1>
+        <div class="user-info">
+            Welcome, {{ username }} | <a href="{{ url_for('logout') }}" class="logout-btn">Logout</a>
+        </div>
+    </div>
+    
+    <div class="nav">
+        <a href="{{ url_for('index') }}">Live View</a>
+        <a href="{{ url_for('error_stats') }}">Error Statistics</a>
+        <a href="{{ url_for('error_analytics_page') }}">Error Analytics</a>
+    </div>
+    
+    <div class="container">
+        <div class="controls">
+            <label for="range">Range:</label>
+            <select id="range">
+                <option value="1:hourly">Last 24 hours (hourly)</option>
+                <option value="7:hourly">Last 7 days (hourly)</option>
+                <option value="30:daily" selected>Last 30 days (daily)</option>
+                <option value="90:daily">Last 90 days (daily)</option>
+                <option value="365:daily">Last year (daily)</option>
+            </select>
+        </div>
+        <div id="charts"></div>
+    </div>
+
+    <script>
+        function formatDuration(seconds) {
+            if (seconds === null) return 'n/a';
+            if (seconds < 120) return seconds + 's';
+            if (seconds < 7200) return Math.round(seconds / 60) + 'm';
+            return (seconds / 3600).toFixed(1) + 'h';
+        }
+        
+        function drawChart(canvas, series) {
+            const ctx = canvas.getContext('2d');
+            canvas.width = canvas.clientWidth;
+            canvas.height = canvas.clientHeight;
+            const max = Math.max(1, ...series.map(p => p.failures));
+            const barWidth = canvas.width / series.length;
+            ctx.fillStyle = '#f44336';
+            series.forEach((p, i) => {
+                const h = (p.failures / max) * (canvas.height - 20);
+                ctx.fillRect(i * barWidth, canvas.height - h, Math.max(1, barWidth - 1), h);
+            });
+            ctx.fillStyle = '#666';
+            ctx.fillText('max ' + max + ' failures', 5, 12);
+        }
+        
+        function loadCharts() {
+            const [days, resolution] = document.getElementById('range').value.split(':');
+            fetch("{{ url_for('error_analytics_api') }}?days=" + days + "&resolution=" + resolution)
+                .then(response => response.json())
+                .then(data => {
+                    const charts = document.getElementById('charts');
+                    charts.innerHTML = '';
+                    for (const [robotId, a] of Object.entries(data)) {
+                        const div = document.createElement('div');
+                        div.className = 'robot-chart';
+                        div.innerHTML = '<h3>' + robotId.toUpperCase() + '</h3>' +
+                            '<div class="summary">Failures: ' + a.failures +
+                            ' | MTBF: ' + formatDuration(a.mtbf_seconds) +
+                            ' | Mean outage: ' + formatDuration(a.mean_outage_seconds) +
+                            ' | Total outage: ' + formatDuration(a.outage_seconds) +
+                            (a.current_outage_seconds !== null ? ' | DOWN for ' + formatDuration(a.current_outage_seconds) : '') +
+                            '</div><canvas></canvas>';
+                        charts.appendChild(div);
+                        drawChart(div.querySelector('canvas'), a.series);
+                    }
+                });
+        }
+        
+        document.getElementById('range').addEventListener('change', loadCharts);
+        loadCharts();
+    </script>
+</body>
+</html>
+'''
+
+app.jinja_loader = DictLoader(TEMPLATES)
 
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Robot camera monitor")
+    parser.add_argument('--record', metavar='FILE',
+                        help="record raw robot responses to a replay file while serving")
+    parser.add_argument('--replay', metavar='FILE',
+                        help="replay a recording through the capture pipeline and exit")
+    parser.add_argument('--fast', action='store_true',
+                        help="replay as fast as possible instead of at recorded speed")
+    args = parser.parse_args()
+    
+    if args.replay:
+        # Offline run: no server and no update thread
+        replay_recording(args.replay, fast=args.fast)
+        raise SystemExit(0)
+    
+    if args.record:
+        start_recording(args.record)
+    
     # Load error counts from previous runs
     load_error_counts()
+    load_error_analytics()
+    load_events()
     
-    # Create initial combined image
-    create_combined_image()
+    if WARM_START:
+        # Serve the last archived frames right away; the update thread
+        # replaces them with the first live capture in the background
+        seed_from_archive()
+    else:
+        # Create initial combined image
+        create_combined_image()
     
     # Start the image update thread
     update_thread = threading.Thread(target=update_images_periodically, daemon=True)